@@ -4,9 +4,14 @@ MVC Architecture with Leaflet.js dynamic frontend + Supabase REST backend
 """
 import os
 from datetime import datetime
+import orjson
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+from flask.json.provider import JSONProvider
+from flask_compress import Compress
+from werkzeug.exceptions import HTTPException, InternalServerError
 from app.controllers.app_controller import AppController
+from app.models.hjertestarterregister_api import HjertestarterregisterAPI
 
 # Load environment variables from .env file
 load_dotenv()
@@ -15,16 +20,99 @@ load_dotenv()
 base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 template_folder = os.path.join(base_dir, 'templates')
 
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson (used by jsonify and request.get_json)"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(
+            obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        ).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__, template_folder=template_folder)
+app.json = ORJSONProvider(app)
+# Brotli/gzip for JSON/GeoJSON/NDJSON responses (coverage layers are several MB raw)
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 500
+app.config['COMPRESS_MIMETYPES'] = ['text/html', 'text/css', 'application/javascript',
+                                    'application/json', 'application/x-ndjson']
+Compress(app)
 controller = AppController()
+# Eager init at import: runs once per process (once in total under gunicorn.conf.py, which preloads)
+controller.initialize()
+# Bound methods for the hot endpoints (skip the attribute chain per request)
+_set_search_point = controller.map_model.set_search_point
+_perform_search = controller.perform_spatial_search
+_fetch_ogc = controller.fetch_ogc_api
+
+# Rendered index page — static between restarts (map data comes via /api/map/layers)
+_index_html = None
+
+# Static datakatalog for hovudsida
+DATA_CATALOG = (
+    {'dataset': 'AED-hjertestartarar (263 stk)',
+     'source': 'Hjertestarterregister API (OAuth 2.0)'},
+    {'dataset': 'Brannstasjonar (OGC WFS)',
+     'source': 'GeoNorge WFS'},
+    {'dataset': 'Beredskapsressursar',
+     'source': 'Lokal GeoJSON'},
+    {'dataset': 'Supabase-stader (PostGIS)',
+     'source': 'Supabase REST'},
+    {'dataset': 'Bakgrunnskart',
+     'source': 'OpenStreetMap CDN'},
+)
+
+# id/name per layer, rebuilt only when the (id, name) pairs change
+_data_sources_key = None
+_data_sources_template = ()
+
+
+@app.after_request
+def add_cache_headers(response):
+    """Let browsers reuse the static main page for a short while"""
+    if request.path == '/' and response.status_code == 200:
+        response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
+
+
+# Feil frå å tolke klientdata (float()/int(), manglande nøklar i JSON-body) → 400
+_CLIENT_ERRORS = (ValueError, TypeError, KeyError)
+
+
+@app.errorhandler(Exception)
+def handle_error(e):
+    """Uncaught errors in /api/ routes → JSON {'status': 'error'}: HTTP errors keep their
+    code, bad client input is 400, anything else 500. Other paths get Flask's default pages."""
+    if isinstance(e, HTTPException):
+        if not request.path.startswith('/api/'):
+            return e
+        return jsonify({'status': 'error', 'message': e.description}), e.code
+    if request.path.startswith('/api/') and isinstance(e, _CLIENT_ERRORS):
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    app.logger.exception(e)
+    if not request.path.startswith('/api/'):
+        return InternalServerError(original_exception=e)
+    return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+def _conditional_json(payload):
+    """jsonify with a weak ETag; 304 Not Modified if the client already has this body"""
+    response = jsonify(payload)
+    # Weak: same content regardless of br/gzip encoding (Flask-Compress leaves it as-is)
+    response.add_etag(weak=True)
+    return response.make_conditional(request)
 
 
-@app.before_request
-def initialize_app():
-    """Initialize app on first request"""
-    if not hasattr(app, 'initialized'):
-        controller.initialize()
-        app.initialized = True
+def _json_object() -> dict:
+    """Request body as a JSON object; a list/scalar body is bad client input (→ 400)"""
+    data = request.get_json()
+    if not isinstance(data, dict):
+        raise ValueError('JSON object expected')
+    return data
 
 
 # ==================== MAIN PAGE ====================
@@ -32,19 +120,11 @@ def initialize_app():
 @app.route('/')
 def index():
     """Render main map page (Leaflet.js loads data dynamically via /api/map/layers)"""
-    data_catalog = [
-        {'dataset': 'AED-hjertestartarar (263 stk)',
-         'source': 'Hjertestarterregister API (OAuth 2.0)'},
-        {'dataset': 'Brannstasjonar (OGC WFS)',
-         'source': 'GeoNorge WFS'},
-        {'dataset': 'Beredskapsressursar',
-         'source': 'Lokal GeoJSON'},
-        {'dataset': 'Supabase-stader (PostGIS)',
-         'source': 'Supabase REST'},
-        {'dataset': 'Bakgrunnskart',
-         'source': 'OpenStreetMap CDN'},
-    ]
-    return render_template('index.html', data_catalog=data_catalog)
+    global _index_html
+    if _index_html is not None:
+        return _index_html
+    _index_html = render_template('index.html', data_catalog=DATA_CATALOG)
+    return _index_html
 
 
 # ==================== DYNAMIC MAP DATA API ====================
@@ -63,49 +143,47 @@ def get_map_layers():
 
 @app.route('/api/search', methods=['POST'])
 def spatial_search():
-    try:
-        data = request.get_json()
-        radius_km = float(data.get('radius_km', 5))
-        lat = float(data.get('lat'))
-        lng = float(data.get('lng'))
-        controller.map_model.set_search_point(lat, lng)
-        results = controller.perform_spatial_search(radius_km)
-        return jsonify({
-            'status': 'success', 'count': len(results),
-            'features': results,
-            'search_point': {'lat': lat, 'lng': lng},
-            'radius_km': radius_km
-        })
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 400
+    data = _json_object()
+    radius_km = float(data.get('radius_km', 5))
+    lat = float(data.get('lat'))
+    lng = float(data.get('lng'))
+    source = data.get('source', 'geojson-local')
+    _set_search_point(lat, lng)
+    results = _perform_search(radius_km, source)
+    return jsonify({
+        'status': 'success', 'count': len(results),
+        'features': results,
+        'search_point': {'lat': lat, 'lng': lng},
+        'radius_km': radius_km,
+        'source': source
+    })
 
 
 @app.route('/api/ogc-api', methods=['POST'])
 def fetch_ogc_data():
-    try:
-        data = request.get_json()
-        url = data.get('url')
-        params = data.get('params', {})
-        if not url:
-            return jsonify({'status': 'error', 'message': 'URL required'}), 400
-        success = controller.fetch_ogc_api(url, params)
-        if success:
-            return jsonify({'status': 'success', 'message': f'Loaded data from {url}'})
-        return jsonify({'status': 'error', 'message': 'Failed to load OGC API data'}), 400
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 400
+    data = _json_object()
+    url = data.get('url')
+    params = data.get('params', {})
+    if not url:
+        return jsonify({'status': 'error', 'message': 'URL required'}), 400
+    success = _fetch_ogc(url, params)
+    if success:
+        return jsonify({'status': 'success', 'message': f'Loaded data from {url}'})
+    return jsonify({'status': 'error', 'message': 'Failed to load OGC API data'}), 400
 
 
 @app.route('/api/data-sources')
 def get_data_sources():
-    sources = []
-    for lid, layer in controller.map_model.layers.items():
-        sources.append({
-            'id': lid,
-            'name': layer.get('name', lid),
-            'visible': layer.get('visible', True),
-        })
-    return jsonify(sources)
+    global _data_sources_key, _data_sources_template
+    layers = controller.map_model.layers
+    key = tuple((lid, layer.name) for lid, layer in layers.items())
+    if key != _data_sources_key:
+        _data_sources_template = tuple({'id': lid, 'name': name} for lid, name in key)
+        _data_sources_key = key
+    return _conditional_json([
+        {**src, 'visible': layers[src['id']].visible}
+        for src in _data_sources_template
+    ])
 
 
 # ==================== POSTGIS SPATIAL ENDPOINTS ====================
@@ -113,191 +191,207 @@ def get_data_sources():
 @app.route('/api/postgis/nearby-aeds', methods=['POST'])
 def get_nearby_aeds_postgis():
     """Find AEDs near a point using PostGIS ST_DWithin (server-side spatial query)"""
-    try:
-        data = request.get_json()
-        lat = float(data.get('latitude'))
-        lng = float(data.get('longitude'))
-        r = float(data.get('radius_km', 5))
-        results = controller.data_model.nearby_hjertestartere(lat, lng, r)
-        return jsonify({
-            'status': 'success',
-            'count': len(results),
-            'search_point': {'latitude': lat, 'longitude': lng},
-            'radius_km': r,
-            'engine': 'PostGIS ST_DWithin',
-            'data': results
-        })
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 400
+    data = _json_object()
+    lat = float(data.get('latitude'))
+    lng = float(data.get('longitude'))
+    r = float(data.get('radius_km', 5))
+    results = controller.data_model.nearby_hjertestartere(lat, lng, r)
+    return jsonify({
+        'status': 'success',
+        'count': len(results),
+        'search_point': {'latitude': lat, 'longitude': lng},
+        'radius_km': r,
+        'engine': 'PostGIS ST_DWithin',
+        'data': results
+    })
 
 
 # ==================== SUPABASE PLACES API ====================
 
 @app.route('/api/supabase/places', methods=['GET'])
 def get_supabase_places():
-    try:
-        places = controller.data_model.get_all_locations()
-        return jsonify({'status': 'success', 'count': len(places), 'data': places})
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 400
+    places = controller.data_model.get_all_locations()
+    return _conditional_json({'status': 'success', 'count': len(places), 'data': places})
+
+
+@app.route('/api/supabase/places/stream', methods=['GET'])
+def stream_supabase_places():
+    """All places as NDJSON (one row per line), fetched page by page from Supabase"""
+    def generate():
+        for row in controller.data_model.iter_all_locations():
+            yield orjson.dumps(row) + b'\n'
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 
 @app.route('/api/supabase/places/<int:place_id>', methods=['GET'])
 def get_supabase_place(place_id):
-    try:
-        place = controller.data_model.get_location_by_id(place_id)
-        if place:
-            return jsonify({'status': 'success', 'data': place})
-        return jsonify({'status': 'error', 'message': f'Place {place_id} not found'}), 404
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 400
+    place = controller.data_model.get_location_by_id(place_id)
+    if place:
+        return jsonify({'status': 'success', 'data': place})
+    return jsonify({'status': 'error', 'message': f'Place {place_id} not found'}), 404
 
 
 @app.route('/api/supabase/places', methods=['POST'])
 def create_supabase_place():
-    try:
-        data = request.get_json()
-        required = ['name', 'description', 'city', 'category', 'latitude', 'longitude']
-        if not all(k in data for k in required):
-            return jsonify({'status': 'error',
-                            'message': f'Missing fields: {", ".join(required)}'}), 400
-        result = controller.data_model.insert_place(
-            name=data['name'], description=data['description'],
-            city=data['city'], category=data['category'],
-            latitude=float(data['latitude']), longitude=float(data['longitude'])
-        )
-        return jsonify({'status': 'success', 'data': result}), 201
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 400
+    data = _json_object()
+    required = ['name', 'description', 'city', 'category', 'latitude', 'longitude']
+    if not all(k in data for k in required):
+        return jsonify({'status': 'error',
+                        'message': f'Missing fields: {", ".join(required)}'}), 400
+    result = controller.data_model.insert_place(
+        name=data['name'], description=data['description'],
+        city=data['city'], category=data['category'],
+        latitude=float(data['latitude']), longitude=float(data['longitude'])
+    )
+    return jsonify({'status': 'success', 'data': result}), 201
 
 
 @app.route('/api/supabase/places/<int:place_id>', methods=['PUT'])
 def update_supabase_place(place_id):
-    try:
-        data = request.get_json()
-        result = controller.data_model.update_supabase('places', place_id, data)
-        if result:
-            return jsonify({'status': 'success', 'data': result})
-        return jsonify({'status': 'error', 'message': f'Place {place_id} not found'}), 404
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 400
+    data = _json_object()
+    result = controller.data_model.update_supabase('places', place_id, data)
+    if result:
+        return jsonify({'status': 'success', 'data': result})
+    return jsonify({'status': 'error', 'message': f'Place {place_id} not found'}), 404
 
 
 @app.route('/api/supabase/places/<int:place_id>', methods=['DELETE'])
 def delete_supabase_place(place_id):
-    try:
-        ok = controller.data_model.delete_supabase('places', place_id)
-        if ok:
-            return jsonify({'status': 'success', 'message': f'Place {place_id} deleted'})
-        return jsonify({'status': 'error', 'message': f'Could not delete {place_id}'}), 404
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 400
+    ok = controller.data_model.delete_supabase('places', place_id)
+    if ok:
+        return jsonify({'status': 'success', 'message': f'Place {place_id} deleted'})
+    return jsonify({'status': 'error', 'message': f'Could not delete {place_id}'}), 404
 
 
 @app.route('/api/supabase/places/nearby', methods=['POST'])
 def get_nearby_places():
-    try:
-        data = request.get_json()
-        lat = float(data.get('latitude'))
-        lng = float(data.get('longitude'))
-        r = float(data.get('radius_km', 10))
-        nearby = controller.data_model.places_within_radius(lat, lng, r)
-        return jsonify({
-            'status': 'success', 'count': len(nearby),
-            'search_point': {'latitude': lat, 'longitude': lng},
-            'radius_km': r, 'data': nearby
-        })
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 400
+    data = _json_object()
+    lat = float(data.get('latitude'))
+    lng = float(data.get('longitude'))
+    r = float(data.get('radius_km', 10))
+    nearby = controller.data_model.places_within_radius(lat, lng, r)
+    return jsonify({
+        'status': 'success', 'count': len(nearby),
+        'search_point': {'latitude': lat, 'longitude': lng},
+        'radius_km': r, 'data': nearby
+    })
+
+
+@app.route('/api/supabase/places/bulk', methods=['POST'])
+def get_places_bulk():
+    """Places for several cities/categories in one Supabase round-trip"""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'status': 'error', 'message': 'JSON object expected'}), 400
+    cities = data.get('cities') or []
+    categories = data.get('categories') or []
+    for field, values in (('cities', cities), ('categories', categories)):
+        if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+            return jsonify({'status': 'error',
+                            'message': f"'{field}' must be a list of strings"}), 400
+    places = controller.data_model.get_places_bulk(cities, categories)
+    by_city: dict = {}
+    by_category: dict = {}
+    for p in places:
+        by_city.setdefault(p.get('city'), []).append(p)
+        by_category.setdefault(p.get('category'), []).append(p)
+    return jsonify({'status': 'success', 'count': len(places),
+                    'cities': cities, 'categories': categories,
+                    'by_city': by_city, 'by_category': by_category,
+                    'data': places})
 
 
 @app.route('/api/supabase/places/city/<city>', methods=['GET'])
 def get_places_by_city(city):
-    try:
-        places = controller.data_model.get_places_by_city(city)
-        return jsonify({'status': 'success', 'city': city,
-                        'count': len(places), 'data': places})
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 400
+    places = controller.data_model.get_places_by_city(city)
+    return _conditional_json({'status': 'success', 'city': city,
+                    'count': len(places), 'data': places})
 
 
 @app.route('/api/supabase/places/category/<category>', methods=['GET'])
 def get_places_by_category(category):
-    try:
-        places = controller.data_model.get_places_by_category(category)
-        return jsonify({'status': 'success', 'category': category,
-                        'count': len(places), 'data': places})
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 400
+    places = controller.data_model.get_places_by_category(category)
+    return _conditional_json({'status': 'success', 'category': category,
+                    'count': len(places), 'data': places})
 
 
 # ==================== HJERTESTARTERREGISTER AED ENDPOINTS ====================
 
 @app.route('/api/aeds/available', methods=['GET'])
 def get_available_aeds():
-    try:
-        lat = request.args.get('latitude', type=float)
-        lng = request.args.get('longitude', type=float)
-        dist = request.args.get('distance', type=int)
-        aeds = controller.data_model.get_available_aeds(
-            latitude=lat, longitude=lng, distance=dist
-        )
-        return jsonify({
-            'status': 'success', 'count': len(aeds),
-            'search_center': {'latitude': lat or 58.1414, 'longitude': lng or 8.0842},
-            'search_radius_km': (dist or 15000) / 1000,
-            'data': aeds
-        })
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 400
+    lat = request.args.get('latitude', type=float)
+    lng = request.args.get('longitude', type=float)
+    dist = request.args.get('distance', type=int)
+    aeds = controller.data_model.get_available_aeds(
+        latitude=lat, longitude=lng, distance=dist
+    )
+    return jsonify({
+        'status': 'success', 'count': len(aeds),
+        'search_center': {
+            'latitude': lat or HjertestarterregisterAPI.KRISTIANSAND_CENTER['latitude'],
+            'longitude': lng or HjertestarterregisterAPI.KRISTIANSAND_CENTER['longitude'],
+        },
+        'search_radius_km': (dist or HjertestarterregisterAPI.DEFAULT_SEARCH_RADIUS) / 1000,
+        'data': aeds
+    })
 
 
 @app.route('/api/aeds/available/count', methods=['GET'])
 def get_available_aeds_count():
-    try:
-        lat = request.args.get('latitude', type=float)
-        lng = request.args.get('longitude', type=float)
-        dist = request.args.get('distance', type=int)
-        aeds = controller.data_model.get_available_aeds(
-            latitude=lat, longitude=lng, distance=dist
-        )
-        return jsonify({'status': 'success', 'count': len(aeds)})
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 400
+    lat = request.args.get('latitude', type=float)
+    lng = request.args.get('longitude', type=float)
+    dist = request.args.get('distance', type=int)
+    aeds = controller.data_model.get_available_aeds(
+        latitude=lat, longitude=lng, distance=dist
+    )
+    return jsonify({'status': 'success', 'count': len(aeds)})
 
 
 # ==================== SEMESTERPROSJEKT: DEKNINGSGAP ====================
 # Oppgave 4 — Totalforsvaret 2025–2026
 # Serverar pre-computed lag frå app/data/coverage/ + dashboard-oppsummering.
 
+def _coverage_response(name):
+    """
+    Heile laget, eller eit utsnitt viss klienten sender
+    ?bbox=min_lon,min_lat,max_lon,max_lat og/eller ?skip_class=<risk_class>.
+    """
+    bbox = request.args.get('bbox')
+    skip = tuple(request.args.getlist('skip_class'))
+    if bbox is None and not skip:
+        return jsonify(controller.get_coverage_layer(name))
+    window = tuple(float(v) for v in bbox.split(',')) if bbox else None
+    return jsonify(controller.get_coverage_window(name, window, skip))
+
+
 @app.route('/api/coverage/service-areas')
 def coverage_service_areas():
     """Buffersoner rundt AED, brannstasjon, sjukehus (GeoJSON, UTM32N → WGS84)"""
-    return jsonify(controller.get_coverage_layer('service_areas'))
+    return _coverage_response('service_areas')
 
 
 @app.route('/api/coverage/gaps')
 def coverage_gaps_endpoint():
     """Dekningsgap-polygonar: befolka område utan AED innan 400m."""
-    return jsonify(controller.get_coverage_layer('coverage_gaps'))
+    return _coverage_response('coverage_gaps')
 
 
 @app.route('/api/coverage/risk-grid')
 def coverage_risk_grid():
     """250m rutenett med population, coverage_frac, risk_score, risk_class."""
-    return jsonify(controller.get_coverage_layer('risk_grid'))
+    return _coverage_response('risk_grid')
 
 
 @app.route('/api/coverage/recommendations')
 def coverage_recommendations():
     """Topp-N anbefalte nye AED-plasseringar (grådig algoritme)."""
-    return jsonify(controller.get_coverage_layer('recommendations'))
+    return _coverage_response('recommendations')
 
 
 @app.route('/api/coverage/population')
 def coverage_population():
     """Befolkningsrutenett (250m) — kalibrert modell over kommunen."""
-    return jsonify(controller.get_coverage_layer('population'))
+    return _coverage_response('population')
 
 
 @app.route('/api/coverage/summary')
@@ -311,4 +405,4 @@ def coverage_summary():
 
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    app.run(debug=os.getenv('FLASK_DEBUG') == '1', port=5000, threaded=True)
@@ -6,12 +6,18 @@ Now supports DYNAMIC data serving — no more frozen Folium HTML.
 Semesterprosjekt (Oppgave 4): les inn pre-computed dekningsgap-lag
 frå app/data/coverage/ og server dei via /api/coverage/* endepunkt.
 """
-import json
+import mmap
 import os
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
+import numpy as np
+import orjson
+import shapely
+from shapely.geometry import box, shape
+from shapely.strtree import STRtree
 from app.models.map_model import MapModel
 from app.models.data_model import DataModel
 
@@ -29,19 +35,55 @@ def _diag_features(label: str, features: list):
     print(f"[{label}] ts={ts}  count={len(features)}  first5={ids_sorted[:5]}  cksum={checksum}")
 
 
+def _place_to_feature(p: Dict) -> Dict:
+    """Supabase places-rad → GeoJSON Point Feature"""
+    props = {
+        "name": p.get('name', ''),
+        "description": p.get('description', ''),
+        "city": p.get('city', ''),
+        "category": p.get('category', ''),
+        "source": "supabase/places"
+    }
+    if 'dist_km' in p:
+        props["dist_km"] = p['dist_km']
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [p['longitude'], p['latitude']]},
+        "properties": props
+    }
+
+
 class AppController:
     def __init__(self):
         self.map_model = MapModel()
         self.data_model = DataModel()
         self.geojson_data = None
         self._local_features = []
+        # STRtree over _local_features (bygd ein gong, gjenbrukt per søk)
+        self._spatial_index: Optional[STRtree] = None
+        # Point-koordinatar som parallelle arrays (NaN for ikkje-punkt)
+        self._lat_arr = np.empty(0, dtype=np.float64)
+        self._lon_arr = np.empty(0, dtype=np.float64)
+        # Samla (min_lon, min_lat, max_lon, max_lat) for alle lokale features
+        self._bbox: Optional[Tuple[float, float, float, float]] = None
         # Semesterprosjekt: pre-computed coverage-lag
         self._coverage_dir = Path(os.path.dirname(os.path.dirname(
             os.path.abspath(__file__)))) / "data" / "coverage"
         self._coverage_cache: Dict[str, Dict] = {}
-
-    def initialize(self):
-        """Initialize data sources (called once at startup)"""
+        # STRtree per coverage-lag for bbox-utsnitt (bygd ved første førespurnad)
+        self._coverage_index: Dict[str, STRtree] = {}
+        # layer -> (MapModel.layer_version, ferdig serialisert FeatureCollection)
+        self._layer_json: Dict[str, Tuple[int, orjson.Fragment]] = {}
+        # Sett av initialize() — ein reload/dobbel-init les ikkje GeoJSON og byggjer ikkje indeks på nytt
+        self._initialized = False
+        # Parallel I/O for get_all_layers_geojson — created on first use, i.e. in the
+        # worker after fork + gevent monkey-patching (Procfile runs gunicorn --preload)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def initialize(self, force: bool = False):
+        """Initialize data sources (called once at startup; repeat calls are no-ops unless force)"""
+        if self._initialized and not force:
+            return True
         try:
             print(f"\n{'='*60}")
             print(f"[INIT] controller.initialize()  {datetime.now().isoformat()}")
@@ -51,6 +93,7 @@ class AppController:
             self._load_local_geojson()
 
             print("OK Controller initialized (data served dynamically per request)")
+            self._initialized = True
             return True
         except Exception as e:
             print(f"ERR Initialization error: {e}")
@@ -79,21 +122,48 @@ class AppController:
             ('hjertestarterregister', {'name': 'AED Locations', 'color': '#ff1744', 'visible': True}),
             ('supabase-places', {'name': 'Supabase Data', 'color': '#009688', 'visible': True}),
         ]:
-            self.map_model.add_layer(lid, cfg)
+            if lid not in self.map_model.layers:  # re-init keeps features + version
+                self.map_model.add_layer(lid, cfg)
 
     # ─── local geojson (static, loaded once) ─────────────────
     def _load_local_geojson(self):
         try:
             base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
             file_path = os.path.join(base_dir, 'data', 'norwegian_landmarks.geojson')
-            with open(file_path, 'r', encoding='utf-8') as f:
-                self.geojson_data = json.load(f)
+            # mmap + orjson: parse straight from the page cache, no str copy of the file
+            with open(file_path, 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf, \
+                    memoryview(buf) as view:
+                self.geojson_data = orjson.loads(view)
             self._local_features = self.geojson_data.get('features', [])
             self.data_model.store_data('geojson-local', self.geojson_data)
             print(f"OK Loaded {len(self._local_features)} features from local GeoJSON")
         except Exception as e:
             print(f"ERR Error loading local GeoJSON: {e}")
             self._local_features = []
+        if self._local_features != self.map_model.layers['geojson-local'].features:
+            self.map_model.set_layer_features('geojson-local', self._local_features)
+        self._build_spatial_index()
+
+    def _build_spatial_index(self):
+        """Build an STRtree and lat/lon arrays over the local features"""
+        if not self._local_features:
+            self._spatial_index = None
+            self._lat_arr = np.empty(0, dtype=np.float64)
+            self._lon_arr = np.empty(0, dtype=np.float64)
+            self._bbox = None
+            return
+        geoms = [shape(f['geometry']) for f in self._local_features]
+        self._spatial_index = STRtree(geoms)
+        self._bbox = tuple(float(v) for v in shapely.total_bounds(geoms))
+
+        coords = np.array([
+            f['geometry']['coordinates'][:2] if f['geometry']['type'] == 'Point'
+            else (np.nan, np.nan)
+            for f in self._local_features
+        ], dtype=np.float64)
+        self._lon_arr = coords[:, 0]
+        self._lat_arr = coords[:, 1]
 
     # ═══════════════════════════════════════════════════════════
     #  Dynamic data getters (called per request — always fresh)
@@ -106,93 +176,125 @@ class AppController:
         ts = datetime.now().isoformat()
         print(f"\n[DYNAMIC] get_all_layers_geojson() at {ts}")
 
+        # 2-4 are independent network calls — run them concurrently
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix='layers')
+        brann_future = self._executor.submit(self._fetch_brannstasjoner)
+        aed_future = self._executor.submit(self._fetch_aeds)
+        places_future = self._executor.submit(self._fetch_places)
+
         layers = {}
 
-        # 1. Local GeoJSON — beredskapsressursar (cached in memory)
-        layers['beredskap'] = {
-            "type": "FeatureCollection",
-            "features": self._local_features
-        }
+        # 1. Local GeoJSON — beredskapsressursar (serialisert på nytt berre når laget endrar seg)
+        layers['beredskap'], beredskap_changed = self._layer_fragment(
+            'geojson-local', self._local_features)
 
         # 2. Brannstasjoner — OGC WFS from GeoNorge (live per request)
+        layers['brannstasjoner'] = brann_future.result()
+
+        # 3. AEDs — prefer Supabase hjertestartere, fallback to live API
+        layers['aeds'] = aed_future.result()
+
+        # 4. Supabase places
+        layers['places'] = places_future.result()
+
+        # Diagnostic
+        live = {k: v for k, v in layers.items() if k != 'beredskap'}
+        total = len(self._local_features) + sum(len(l.get('features', [])) for l in live.values())
+        print(f"[DYNAMIC] total features across all layers = {total}")
+        if beredskap_changed:
+            _diag_features("DYNAMIC-layer-beredskap", self._local_features)
+        for name, fc in live.items():
+            _diag_features(f"DYNAMIC-layer-{name}", fc.get('features', []))
+
+        return layers
+
+    def _layer_fragment(self, layer_id: str, features: List[Dict]) -> Tuple[orjson.Fragment, bool]:
+        """FeatureCollection as a pre-serialized orjson.Fragment, rebuilt only when
+        MapModel.layer_version(layer_id) has moved; also returns whether it was rebuilt"""
+        version = self.map_model.layer_version(layer_id)
+        cached = self._layer_json.get(layer_id)
+        if cached is not None and cached[0] == version:
+            return cached[1], False
+        fragment = orjson.Fragment(orjson.dumps(
+            {"type": "FeatureCollection", "features": features}))
+        self._layer_json[layer_id] = (version, fragment)
+        return fragment, True
+
+    def _fetch_brannstasjoner(self) -> Dict:
         try:
-            brann_geojson = self.data_model.fetch_brannstasjoner_wfs()
-            layers['brannstasjoner'] = brann_geojson
+            return self.data_model.fetch_brannstasjoner_wfs()
         except Exception as e:
             print(f"[DYNAMIC] ERR brannstasjoner WFS failed: {e}")
-            layers['brannstasjoner'] = {"type": "FeatureCollection", "features": []}
+            return {"type": "FeatureCollection", "features": []}
 
-        # 3. AEDs — prefer Supabase hjertestartere, fallback to live API
+    def _fetch_aeds(self) -> Dict:
         aed_geojson = self.data_model.get_hjertestartere_geojson()
         if len(aed_geojson.get('features', [])) == 0:
             print("[DYNAMIC] hjertestartere table empty/missing — falling back to live API")
             aed_geojson = self._fetch_aeds_from_api()
-        layers['aeds'] = aed_geojson
+        return aed_geojson
 
-        # 3. Supabase places
+    def _fetch_places(self) -> Dict:
         places = self.data_model.get_all_locations('places')
-        place_features = []
-        for p in places:
-            if p.get('latitude') and p.get('longitude'):
-                place_features.append({
-                    "type": "Feature",
-                    "geometry": {"type": "Point",
-                                 "coordinates": [p['longitude'], p['latitude']]},
-                    "properties": {
-                        "name": p.get('name', ''),
-                        "description": p.get('description', ''),
-                        "city": p.get('city', ''),
-                        "category": p.get('category', ''),
-                        "source": "supabase/places"
-                    }
-                })
-        layers['places'] = {
+        return {
             "type": "FeatureCollection",
-            "features": place_features
+            "features": [_place_to_feature(p) for p in places
+                         if p.get('latitude') and p.get('longitude')]
         }
 
-        # Diagnostic
-        total = sum(len(l.get('features', [])) for l in layers.values())
-        print(f"[DYNAMIC] total features across all layers = {total}")
-        for name, fc in layers.items():
-            _diag_features(f"DYNAMIC-layer-{name}", fc.get('features', []))
-
-        return layers
-
     # ─── Keep backward-compat methods ────────────────────────
     def _fetch_aeds_from_api(self) -> Dict:
         """Fallback: fetch AEDs directly from Hjertestarterregister API"""
         try:
-            from app.models.hjertestarterregister_api import HjertestarterregisterAPI
-            api = HjertestarterregisterAPI()
-            if api.client_id and api.client_secret:
-                api.authenticate()
+            api = self.data_model.hjertestarter_api()
+            center = api.KRISTIANSAND_CENTER
             response = api.search_assets(
-                latitude=58.1414, longitude=8.0842, distance=15000, max_rows=5000
+                latitude=center['latitude'], longitude=center['longitude'],
+                distance=api.DEFAULT_SEARCH_RADIUS, max_rows=5000
             )
             if response and 'ASSETS' in response:
                 geojson = api.convert_to_geojson(response)
-                # Enhance with is_available
+                # Enhance with is_available — one dict lookup per feature, not a scan of ASSETS
+                assets_by_id = {a.get('ASSET_ID'): a for a in reversed(response['ASSETS'])}
                 for feature in geojson['features']:
-                    for asset in response['ASSETS']:
-                        if asset.get('ASSET_ID') == feature['properties'].get('asset_id'):
-                            feature['properties']['is_available'] = asset.get('IS_OPEN') == 'Y'
-                            feature['properties']['is_open'] = asset.get('IS_OPEN') == 'Y'
-                            feature['properties']['is_active'] = asset.get('ACTIVE', 'Y') == 'Y'
-                            feature['properties']['is_open_status'] = asset.get('IS_OPEN', 'N')
-                            break
+                    asset = assets_by_id.get(feature['properties'].get('asset_id'))
+                    if asset is not None:
+                        feature['properties']['is_available'] = asset.get('IS_OPEN') == 'Y'
+                        feature['properties']['is_open'] = asset.get('IS_OPEN') == 'Y'
+                        feature['properties']['is_active'] = asset.get('ACTIVE', 'Y') == 'Y'
+                        feature['properties']['is_open_status'] = asset.get('IS_OPEN', 'N')
                 _diag_features("DYNAMIC-AED-API-FALLBACK", geojson['features'])
                 return geojson
         except Exception as e:
             print(f"ERR API fallback failed: {e}")
         return {"type": "FeatureCollection", "features": []}
 
-    def perform_spatial_search(self, radius_km: float) -> List[Dict]:
+    def perform_spatial_search(self, radius_km: float,
+                               source: str = 'geojson-local') -> List[Dict]:
         search_point = self.map_model.get_search_point()
         if not search_point:
             return []
-        features = self._local_features
-        return self.data_model.filter_by_distance(features, search_point, radius_km)
+        if source == 'supabase-places':
+            # PostGIS ST_DWithin over the GiST index — only the hits cross the wire
+            rows = self.data_model.places_within_radius(
+                search_point[0], search_point[1], radius_km)
+            return [_place_to_feature(p) for p in rows]
+        if self._spatial_index is None:
+            return []
+
+        # Bbox pre-filter via STRtree, then vectorized WGS84 geodesic on the candidates only
+        lat, lng = search_point
+        q_min_lon, q_min_lat, q_max_lon, q_max_lat = self.data_model.radius_bounds(
+            lat, lng, radius_km)
+        min_lon, min_lat, max_lon, max_lat = self._bbox
+        if (q_max_lon < min_lon or q_min_lon > max_lon or
+                q_max_lat < min_lat or q_min_lat > max_lat):
+            return []
+        hits = np.sort(self._spatial_index.query(
+            box(q_min_lon, q_min_lat, q_max_lon, q_max_lat)))
+        d = self.data_model.geodesic_km(lat, lng, self._lat_arr[hits], self._lon_arr[hits])
+        return [self._local_features[i] for i in hits[d <= radius_km]]
 
     def fetch_ogc_api(self, url: str, params: Dict = None) -> bool:
         try:
@@ -242,8 +344,8 @@ class AppController:
             return {"type": "FeatureCollection", "features": []}
 
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            with open(path, "rb") as f:
+                data = orjson.loads(f.read())
             self._coverage_cache[name] = data
             print(f"[COVERAGE] OK Lasta {path.name} "
                   f"({len(data.get('features', []))} features)")
@@ -252,6 +354,26 @@ class AppController:
             print(f"[COVERAGE] ERR Kunne ikkje lese {path.name}: {e}")
             return {"type": "FeatureCollection", "features": []}
 
+    def get_coverage_window(self, name: str,
+                            bbox: Optional[Tuple[float, float, float, float]] = None,
+                            skip_classes: Tuple[str, ...] = ()) -> Dict:
+        """
+        Berre dei features i eit coverage-lag som klienten faktisk teiknar:
+        dei som skjer bbox (min_lon, min_lat, max_lon, max_lat), utan risk_class
+        i skip_classes. Held nyttelasta på storleik med kartutsnittet.
+        """
+        feats = self.get_coverage_layer(name).get('features', [])
+        if bbox is not None and feats:
+            tree = self._coverage_index.get(name)
+            if tree is None:
+                tree = STRtree([shape(f['geometry']) for f in feats])
+                self._coverage_index[name] = tree
+            feats = [feats[i] for i in np.sort(tree.query(box(*bbox)))]
+        if skip_classes:
+            feats = [f for f in feats
+                     if f['properties'].get('risk_class', 'ingen') not in skip_classes]
+        return {"type": "FeatureCollection", "features": feats}
+
     def coverage_summary(self) -> Dict:
         """
         Rekn ut nøkkeltall for dekningsstatus — brukast i sidepanel/dashboard.
@@ -261,16 +383,18 @@ class AppController:
         gaps = self.get_coverage_layer("coverage_gaps")
 
         feats = risk.get("features", [])
-        total_pop = sum(f["properties"].get("population", 0) for f in feats)
-        covered = sum(
-            f["properties"].get("population", 0) * f["properties"].get("coverage_frac", 0)
-            for f in feats
-        )
-        uncovered = total_pop - covered
+        total_pop = 0.0
+        covered = 0.0
         class_counts: Dict[str, int] = {}
+        # Eitt pass over rutenettet, properties-dicten slått opp éin gong per celle
         for f in feats:
-            c = f["properties"].get("risk_class", "ingen")
+            props = f["properties"]
+            pop = props.get("population", 0)
+            total_pop += pop
+            covered += pop * props.get("coverage_frac", 0)
+            c = props.get("risk_class", "ingen")
             class_counts[c] = class_counts.get(c, 0) + 1
+        uncovered = total_pop - covered
 
         return {
             "total_population": round(total_pop, 0),
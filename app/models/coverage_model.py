@@ -15,7 +15,6 @@ for korrekte meter-baserte avstandsutrekningar.
 """
 from __future__ import annotations
 
-import json
 import math
 import os
 from pathlib import Path
@@ -23,6 +22,7 @@ from typing import Dict, List, Optional, Tuple
 
 import geopandas as gpd
 import numpy as np
+import orjson
 import pandas as pd
 from shapely.geometry import MultiPolygon, Point, Polygon, box, mapping, shape
 from shapely.ops import unary_union
@@ -51,8 +51,8 @@ CRITICAL_RADIUS_M   = 400      # AED må finnast innanfor denne radiusen
 # ══════════════════════════════════════════════════════════════════════════
 def _load_geojson(path: str | Path) -> gpd.GeoDataFrame:
     """Last GeoJSON frå fil til GeoDataFrame (WGS84)."""
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    with open(path, "rb") as f:
+        data = orjson.loads(f.read())
     gdf = gpd.GeoDataFrame.from_features(data.get("features", []), crs=WGS84)
     return gdf
 
@@ -3,27 +3,70 @@ DataModel.py - Handles geographic data fetching and spatial operations
 Supports GeoJSON, OGC APIs (WFS), and PostGIS/Supabase via REST API (httpx)
 """
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import math
 import os
 import hashlib
+import gzip
+import time
 import httpx
+import orjson
+import numpy as np
 import xml.etree.ElementTree as ET
 from datetime import datetime
-from typing import Dict, List, Tuple, Optional
-from geopy.distance import geodesic
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Tuple, Optional
 from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+try:  # valfri: straumande parsing av store OGC API-svar (fetch_ogc_api)
+    import ijson
+except ImportError:
+    ijson = None
+
+EARTH_RADIUS_KM = 6371.0
+# Default centre for Norway-wide Hjertestarterregister queries (lat, lng)
+NORWAY_CENTER = (60.4518, 8.4689)
+
+# pyproj (~25 ms) vert importert ved første bruk, ikkje når modulen vert lasta.
+# _UNSET = ikkje prøvd enno.
+_UNSET = object()
+_GEOD = _UNSET
+
+
+def _wgs84_geod():
+    """pyproj.Geod on the WGS84 ellipsoid (same ellipsoid as the PostGIS geography type), or None without pyproj"""
+    global _GEOD
+    if _GEOD is _UNSET:
+        try:
+            from pyproj import Geod
+            _GEOD = Geod(ellps='WGS84')
+        except ImportError:
+            _GEOD = None
+    return _GEOD
+
+
+def _in_list(values) -> str:
+    """PostgREST in.(...) operand with each value double-quoted (commas, quotes, backslashes)"""
+    quoted = ','.join('"' + str(x).replace('\\', '\\\\').replace('"', '\\"') + '"'
+                      for x in values)
+    return f"({quoted})"
 
 
 class SupabaseREST:
     """Lightweight Supabase REST client using httpx (avoids broken supabase-py proxy)"""
 
     def __init__(self):
+        # .env is only parsed when the process environment does not already carry the config
+        if 'SUPABASE_URL' not in os.environ:
+            load_dotenv()
         self.url = os.getenv('SUPABASE_URL', '')
         self.key = os.getenv('SUPABASE_ANON_KEY', '')
         self.ready = bool(self.url and self.key)
+        # One pooled client → TCP/TLS connections are kept alive between calls
+        self.client = httpx.Client(
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+        )
         if self.ready:
             ref = self.url.split('//')[1].split('.')[0] if '//' in self.url else '???'
             print(f"OK Supabase REST client ready (project={ref})")
@@ -52,32 +95,58 @@ class SupabaseREST:
             params['order'] = order
         if limit:
             params['limit'] = str(limit)
-        # Build filter query string
-        filter_parts = []
+        # Filters go in params too: httpx percent-encodes them (& # + in names), and a
+        # query string baked into the URL is dropped when params= is given (httpx >= 0.28)
         if filters:
             for k, v in filters.items():
-                filter_parts.append(f"{k}=eq.{v}")
-        url = self._rest(table)
-        if filter_parts:
-            url += "?" + "&".join(filter_parts)
+                if isinstance(v, (list, tuple, set)):
+                    params[k] = f"in.{_in_list(v)}"
+                else:
+                    params[k] = f"eq.{v}"
         try:
-            r = httpx.get(url, params=params, headers=self._headers, timeout=15.0)
+            r = self.client.get(self._rest(table), params=params,
+                                headers=self._headers, timeout=15.0)
             if r.status_code == 200:
-                return r.json()
+                return orjson.loads(r.content)
             print(f"WARN Supabase SELECT {table}: {r.status_code} {r.text[:200]}")
             return []
         except Exception as e:
             print(f"WARN Supabase SELECT {table} error: {e}")
             return []
 
+    def iter_select(self, table: str, columns: str = "*", order: str = "id.asc",
+                    page_size: int = 1000) -> Iterator[Dict]:
+        """Yield rows page by page (limit/offset) instead of loading the whole table"""
+        if not self.ready:
+            return
+        offset = 0
+        while True:
+            params = {'select': columns, 'order': order,
+                      'limit': str(page_size), 'offset': str(offset)}
+            try:
+                r = self.client.get(self._rest(table), params=params,
+                              headers=self._headers, timeout=15.0)
+            except Exception as e:
+                print(f"WARN Supabase SELECT {table} (offset={offset}) error: {e}")
+                return
+            if r.status_code not in (200, 206):
+                print(f"WARN Supabase SELECT {table}: {r.status_code} {r.text[:200]}")
+                return
+            rows = orjson.loads(r.content)
+            yield from rows
+            if len(rows) < page_size:
+                return
+            offset += page_size
+
     # ── INSERT ──────────────────────────────────────────────
     def insert(self, table: str, data: Dict) -> Dict:
         if not self.ready:
             return {}
         try:
-            r = httpx.post(self._rest(table), json=data, headers=self._headers, timeout=10.0)
+            r = self.client.post(self._rest(table), content=orjson.dumps(data),
+                                 headers=self._headers, timeout=10.0)
             if r.status_code in (200, 201):
-                rows = r.json()
+                rows = orjson.loads(r.content)
                 return rows[0] if rows else {}
             print(f"WARN Supabase INSERT {table}: {r.status_code}")
             return {}
@@ -85,17 +154,36 @@ class SupabaseREST:
             print(f"WARN Supabase INSERT {table} error: {e}")
             return {}
 
+    # ── UPSERT (bulk) ───────────────────────────────────────
+    def upsert(self, table: str, rows: List[Dict], on_conflict: str = None) -> bool:
+        """Insert-or-update many rows in one request (merge on the on_conflict column)"""
+        if not self.ready or not rows:
+            return False
+        url = self._rest(table)
+        if on_conflict:
+            url += f"?on_conflict={on_conflict}"
+        headers = {**self._headers, 'Prefer': 'resolution=merge-duplicates,return=minimal'}
+        try:
+            r = self.client.post(url, content=orjson.dumps(rows), headers=headers, timeout=30.0)
+            if r.status_code in (200, 201, 204):
+                return True
+            print(f"WARN Supabase UPSERT {table}: {r.status_code} {r.text[:200]}")
+            return False
+        except Exception as e:
+            print(f"WARN Supabase UPSERT {table} error: {e}")
+            return False
+
     # ── UPDATE ──────────────────────────────────────────────
     def update(self, table: str, record_id: int, data: Dict) -> Dict:
         if not self.ready:
             return {}
         try:
-            r = httpx.patch(
+            r = self.client.patch(
                 f"{self._rest(table)}?id=eq.{record_id}",
-                json=data, headers=self._headers, timeout=10.0
+                content=orjson.dumps(data), headers=self._headers, timeout=10.0
             )
             if r.status_code in (200, 204):
-                rows = r.json() if r.text else []
+                rows = orjson.loads(r.content) if r.content else []
                 return rows[0] if rows else {}
             print(f"WARN Supabase UPDATE {table}: {r.status_code}")
             return {}
@@ -108,7 +196,7 @@ class SupabaseREST:
         if not self.ready:
             return False
         try:
-            r = httpx.delete(
+            r = self.client.delete(
                 f"{self._rest(table)}?id=eq.{record_id}",
                 headers=self._headers, timeout=10.0
             )
@@ -117,17 +205,31 @@ class SupabaseREST:
             print(f"WARN Supabase DELETE {table} error: {e}")
             return False
 
+    def delete_in(self, table: str, column: str, values) -> bool:
+        """Delete every row whose column is in values — one request instead of one per row"""
+        if not self.ready or not values:
+            return False
+        try:
+            r = self.client.delete(
+                self._rest(table), params={column: f"in.{_in_list(values)}"},
+                headers={**self._headers, 'Prefer': 'return=minimal'}, timeout=30.0
+            )
+            return r.status_code in (200, 204)
+        except Exception as e:
+            print(f"WARN Supabase DELETE {table} error: {e}")
+            return False
+
     # ── RPC ─────────────────────────────────────────────────
     def rpc(self, fn_name: str, params: Dict) -> List[Dict]:
         if not self.ready:
             return []
         try:
-            r = httpx.post(
+            r = self.client.post(
                 f"{self.url}/rest/v1/rpc/{fn_name}",
-                json=params, headers=self._headers, timeout=15.0
+                content=orjson.dumps(params), headers=self._headers, timeout=15.0
             )
             if r.status_code == 200:
-                return r.json()
+                return orjson.loads(r.content)
             print(f"WARN Supabase RPC {fn_name}: {r.status_code}")
             return []
         except Exception as e:
@@ -136,10 +238,32 @@ class SupabaseREST:
 
 
 class DataModel:
+    # Seconds a cached Supabase read stays valid (writes invalidate immediately);
+    # overridable with the SUPABASE_CACHE_TTL env var
+    SUPABASE_CACHE_TTL = 60
+    # Kolonnar i hjertestartere som get_hjertestartere_geojson faktisk les (sjå supabase_schema.sql)
+    HJERTESTARTER_COLUMNS = ('asset_id,site_name,site_address,site_post_area,'
+                             'site_latitude,site_longitude,is_open,opening_hours_text,distance_km')
+    # Hjertestarterregister-svar endrar seg sjeldan — disk-cache i eit døgn
+    AED_CACHE_TTL = 86400
+
     def __init__(self):
         self.data_sources = {}
         self.loaded_data = {}
         self.sb = SupabaseREST()
+        # Shared session for OGC/WFS requests (keep-alive + retry on transient errors)
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=20, pool_maxsize=50,
+                              max_retries=Retry(total=3, backoff_factor=0.2,
+                                                status_forcelist=(502, 503, 504)))
+        self.http.mount('https://', adapter)
+        self.http.mount('http://', adapter)
+        self._aed_api = None
+        # (table, filters) -> (fetched_at, rows, disk file mtime_ns); mirrored to gzip'd JSON on disk
+        self._query_cache: Dict[Tuple, Tuple[float, List[Dict], int]] = {}
+        self.cache_ttl = float(os.getenv('SUPABASE_CACHE_TTL', self.SUPABASE_CACHE_TTL))
+        self.cache_dir = Path(os.getenv('IS218_CACHE_DIR',
+                                        Path.home() / '.cache' / 'is218'))
         # Backward-compat: code that checks `if self.supabase_client`
         self.supabase_client = self.sb if self.sb.ready else None
 
@@ -151,9 +275,15 @@ class DataModel:
     # ═══════════════════════════════════════════════════════════
     def fetch_ogc_api(self, url: str, params: Dict = None) -> Dict:
         try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            return response.json()
+            with self.http.get(url, params=params, timeout=10, stream=True) as response:
+                response.raise_for_status()
+                content_type = response.headers.get('Content-Type', '')
+                if ijson is not None and 'geo+json' in content_type:
+                    # Features are decoded one by one off the socket — no full body/str copy
+                    response.raw.decode_content = True
+                    features = list(ijson.items(response.raw, 'features.item', use_float=True))
+                    return {"type": "FeatureCollection", "features": features}
+                return orjson.loads(response.content)
         except requests.exceptions.RequestException as e:
             print(f"Error fetching OGC API from {url}: {e}")
             raise
@@ -164,20 +294,126 @@ class DataModel:
     def query_supabase(self, table_name: str, filters: Dict = None) -> List[Dict]:
         return self.sb.select(table_name, filters=filters)
 
+    def cached_query_supabase(self, table_name: str, filters: Dict = None) -> List[Dict]:
+        """
+        query_supabase with a TTL cache in memory, backed by a gzip file in cache_dir
+        that all gunicorn workers share. Writes delete the table's files and bump its
+        stamp (_invalidate_cache); a memory hit is only served while its file is unchanged
+        (same mtime), so another worker's write is seen on the next read, not after the TTL.
+        Empty/failed reads are not cached in either tier.
+        """
+        key = (table_name, tuple(sorted(
+            (k, tuple(v) if isinstance(v, (list, tuple, set)) else v)
+            for k, v in (filters or {}).items()
+        )))
+        if not self.sb.ready:
+            return self.query_supabase(table_name, filters=filters)
+
+        disk_path = self._disk_cache_path(key)
+        hit = self._query_cache.get(key)
+        if (hit and time.monotonic() - hit[0] < self.cache_ttl
+                and self._disk_mtime(disk_path) == hit[2]):
+            return hit[1]
+
+        stamp = self._disk_mtime(self._table_stamp_path(table_name))
+        before = self._disk_mtime(disk_path)
+        rows = self._read_disk_cache(disk_path)
+        if rows is None:
+            rows = self.query_supabase(table_name, filters=filters)
+            # A write in another worker during the fetch → these rows may predate it
+            if not rows or self._disk_mtime(self._table_stamp_path(table_name)) != stamp:
+                return rows
+            self._write_disk_cache(disk_path, rows)
+        elif self._disk_mtime(disk_path) != before:
+            return rows  # file replaced/removed while reading
+        mtime = self._disk_mtime(disk_path)
+        if rows and mtime is not None:
+            self._query_cache[key] = (time.monotonic(), rows, mtime)
+        return rows
+
+    @staticmethod
+    def _disk_mtime(path: Path) -> Optional[int]:
+        try:
+            return path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _table_stamp_path(self, table_name: str) -> Path:
+        """Touched on every write to the table; its mtime changes when any worker writes"""
+        return self.cache_dir / f"{table_name}.stamp"
+
+    def _disk_cache_path(self, key: Tuple) -> Path:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+        return self.cache_dir / f"{key[0]}_{digest}.json.gz"
+
+    def _read_disk_cache(self, path: Path, ttl: float = None):
+        try:
+            if time.time() - path.stat().st_mtime >= (self.cache_ttl if ttl is None else ttl):
+                return None
+            with gzip.open(path, 'rb') as f:
+                return orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+
+    def _write_disk_cache(self, path: Path, rows):
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix('.tmp')
+            with gzip.open(tmp, 'wb', compresslevel=5) as f:
+                f.write(orjson.dumps(rows))
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"WARN Could not write cache {path.name}: {e}")
+
+    def _invalidate_cache(self, table_name: str):
+        for key in [k for k in self._query_cache if k[0] == table_name]:
+            del self._query_cache[key]
+        for path in self.cache_dir.glob(f"{table_name}_*.json.gz"):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._table_stamp_path(table_name).touch()
+        except OSError as e:
+            print(f"WARN Could not stamp cache for {table_name}: {e}")
+
     def insert_supabase(self, table_name: str, data: Dict) -> Dict:
         result = self.sb.insert(table_name, data)
+        self._invalidate_cache(table_name)
         if result:
             print(f"OK Data inserted into {table_name}")
         return result
 
+    def bulk_insert_supabase(self, table_name: str, rows: List[Dict],
+                             on_conflict: str = None, chunk: int = 500,
+                             on_batch: Callable[[int, List[Dict], bool], None] = None) -> int:
+        """Upsert rows in chunks of `chunk` (one round-trip per chunk); returns rows written.
+        on_batch(index, batch, ok) is called after each chunk, e.g. for per-batch stats."""
+        written = 0
+        for i in range(0, len(rows), chunk):
+            batch = rows[i:i + chunk]
+            ok = self.sb.upsert(table_name, batch, on_conflict=on_conflict)
+            if ok:
+                written += len(batch)
+            if on_batch is not None:
+                on_batch(i // chunk, batch, ok)
+        self._invalidate_cache(table_name)
+        if written:
+            print(f"OK {written} rows upserted into {table_name}")
+        return written
+
     def update_supabase(self, table_name: str, record_id: int, data: Dict) -> Dict:
         result = self.sb.update(table_name, record_id, data)
+        self._invalidate_cache(table_name)
         if result:
             print(f"OK Data updated in {table_name}")
         return result
 
     def delete_supabase(self, table_name: str, record_id: int) -> bool:
         ok = self.sb.delete(table_name, record_id)
+        self._invalidate_cache(table_name)
         if ok:
             print(f"OK Data deleted from {table_name}")
         return ok
@@ -185,34 +421,74 @@ class DataModel:
     # ═══════════════════════════════════════════════════════════
     #  Spatial filter
     # ═══════════════════════════════════════════════════════════
-    def filter_by_distance(self, features: List[Dict], point: Tuple[float, float],
-                           radius_km: float) -> List[Dict]:
-        filtered = []
-        for feature in features:
-            if feature['geometry']['type'] == 'Point':
-                coords = feature['geometry']['coordinates']
-                feature_point = (coords[1], coords[0])
-                distance_km = geodesic(point, feature_point).kilometers
-                if distance_km <= radius_km:
-                    filtered.append(feature)
-        return filtered
+    @staticmethod
+    def radius_bounds(lat: float, lng: float,
+                      radius_km: float) -> Tuple[float, float, float, float]:
+        """(min_lon, min_lat, max_lon, max_lat) guaranteed to contain every point within
+        radius_km of (lat, lng). Exact spherical-cap bounds with 1 % slack for the WGS84
+        ellipsoid; full longitude range once the cap reaches a pole or the antimeridian."""
+        delta = 1.01 * radius_km / EARTH_RADIUS_KM  # angular radius
+        dlat = math.degrees(delta)
+        min_lat, max_lat = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+        cos_lat = math.cos(math.radians(lat))
+        if delta >= math.pi / 2 or math.sin(delta) >= cos_lat:
+            return -180.0, min_lat, 180.0, max_lat  # pole inside the circle
+        # Widest point of the cap is poleward of the centre, not at its latitude
+        dlng = math.degrees(math.asin(math.sin(delta) / cos_lat))
+        if lng - dlng < -180.0 or lng + dlng > 180.0:
+            return -180.0, min_lat, 180.0, max_lat
+        return lng - dlng, min_lat, lng + dlng, max_lat
+
+    @staticmethod
+    def haversine_km(lat: float, lng: float, lat_arr: np.ndarray,
+                     lon_arr: np.ndarray) -> np.ndarray:
+        """Vectorized Haversine distance (km) from one point to coordinate arrays"""
+        dlat = np.radians(lat_arr - lat)
+        dlon = np.radians(lon_arr - lng)
+        a = (np.sin(dlat / 2) ** 2 +
+             np.cos(np.radians(lat)) * np.cos(np.radians(lat_arr)) * np.sin(dlon / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+    @staticmethod
+    def geodesic_km(lat: float, lng: float, lat_arr: np.ndarray,
+                    lon_arr: np.ndarray) -> np.ndarray:
+        """Vectorized WGS84 ellipsoid distance (km) via pyproj.Geod; Haversine if pyproj is missing"""
+        geod = _wgs84_geod()
+        if geod is None:
+            return DataModel.haversine_km(lat, lng, lat_arr, lon_arr)
+        _, _, dist_m = geod.inv(np.full_like(lon_arr, lng), np.full_like(lat_arr, lat),
+                                 lon_arr, lat_arr)
+        return np.asarray(dist_m) / 1000.0
 
     # ═══════════════════════════════════════════════════════════
     #  Hjertestarterregister (external API)
     # ═══════════════════════════════════════════════════════════
+    def hjertestarter_api(self):
+        """Shared API client on self.http — keeps the OAuth token and pooled TLS connections."""
+        if self._aed_api is None:
+            from app.models.hjertestarterregister_api import HjertestarterregisterAPI
+            self._aed_api = HjertestarterregisterAPI(session=self.http)
+        return self._aed_api
+
     def fetch_hjertestarterregister(self, latitude: float = None, longitude: float = None,
-                                     distance: int = 99999) -> Dict:
-        from app.models.hjertestarterregister_api import HjertestarterregisterAPI
+                                     distance: int = 99999, force_refresh: bool = False) -> Dict:
+        """AEDs as GeoJSON; non-empty results are kept on disk for AED_CACHE_TTL seconds"""
         try:
-            api = HjertestarterregisterAPI()
-            if api.client_id and api.client_secret:
-                api.authenticate()
             if latitude is None or longitude is None:
-                latitude, longitude = 60.4518, 8.4689
+                latitude, longitude = NORWAY_CENTER
+            disk_path = self._disk_cache_path(('aed', latitude, longitude, distance))
+            if not force_refresh:
+                cached = self._read_disk_cache(disk_path, ttl=self.AED_CACHE_TTL)
+                if cached is not None:
+                    return cached
+            api = self.hjertestarter_api()
             response = api.search_assets(latitude=latitude, longitude=longitude,
                                          distance=distance, max_rows=5000)
             if response:
-                return api.convert_to_geojson(response)
+                geojson = api.convert_to_geojson(response)
+                if geojson['features']:
+                    self._write_disk_cache(disk_path, geojson)
+                return geojson
             return {"type": "FeatureCollection", "features": []}
         except Exception as e:
             print(f"ERR Error fetching Hjertestarterregister data: {e}")
@@ -220,11 +496,8 @@ class DataModel:
 
     def get_available_aeds(self, latitude: float = None, longitude: float = None,
                            distance: int = None) -> List[Dict]:
-        from app.models.hjertestarterregister_api import HjertestarterregisterAPI
         try:
-            api = HjertestarterregisterAPI()
-            if api.client_id and api.client_secret:
-                api.authenticate()
+            api = self.hjertestarter_api()
             return api.search_available_aeds(latitude=latitude, longitude=longitude,
                                              distance=distance)
         except Exception as e:
@@ -236,8 +509,12 @@ class DataModel:
     # ═══════════════════════════════════════════════════════════
     def get_hjertestartere_geojson(self) -> Dict:
         """Fetch AEDs from Supabase hjertestartere table and return as GeoJSON"""
-        rows = self.sb.select('hjertestartere')
+        # Only the columns the features use (skips the PostGIS location blob, synced_at, ...);
+        # falls back to * if the table predates one of them
+        rows = (self.sb.select('hjertestartere', columns=self.HJERTESTARTER_COLUMNS)
+                or self.sb.select('hjertestartere'))
         features = []
+        business_hours = self._is_business_hours_now()  # éin gong per kall, ikkje per rad
         for row in rows:
             lat = row.get('site_latitude')
             lng = row.get('site_longitude')
@@ -253,9 +530,7 @@ class DataModel:
             opening_hours_text = (row.get('opening_hours_text') or '').strip()
             registered_open = self._truthy_status(open_status)
             assumed_business_hours = is_active and not registered_open
-            is_open = registered_open or (
-                assumed_business_hours and self._is_business_hours_now()
-            )
+            is_open = registered_open or (assumed_business_hours and business_hours)
             feature = {
                 "type": "Feature",
                 "geometry": {"type": "Point", "coordinates": [lng, lat]},
@@ -331,10 +606,14 @@ class DataModel:
     #  Places helpers
     # ═══════════════════════════════════════════════════════════
     def get_all_locations(self, table_name: str = 'places') -> List[Dict]:
-        return self.query_supabase(table_name)
+        return self.cached_query_supabase(table_name)
+
+    def iter_all_locations(self, table_name: str = 'places',
+                           page_size: int = 1000) -> Iterator[Dict]:
+        return self.sb.iter_select(table_name, page_size=page_size)
 
     def get_location_by_id(self, location_id: int, table_name: str = 'places') -> Optional[Dict]:
-        results = self.query_supabase(table_name, filters={'id': location_id})
+        results = self.cached_query_supabase(table_name, filters={'id': location_id})
         return results[0] if results else None
 
     def places_within_radius(self, latitude: float, longitude: float,
@@ -351,10 +630,20 @@ class DataModel:
         })
 
     def get_places_by_city(self, city: str) -> List[Dict]:
-        return self.query_supabase('places', filters={'city': city})
+        return self.cached_query_supabase('places', filters={'city': city})
 
     def get_places_by_category(self, category: str) -> List[Dict]:
-        return self.query_supabase('places', filters={'category': category})
+        return self.cached_query_supabase('places', filters={'category': category})
+
+    def get_places_bulk(self, cities: List[str] = None,
+                        categories: List[str] = None) -> List[Dict]:
+        """Places matching any of `cities` AND any of `categories` in one query (IN filters)"""
+        filters = {}
+        if cities:
+            filters['city'] = sorted(set(cities))
+        if categories:
+            filters['category'] = sorted(set(categories))
+        return self.cached_query_supabase('places', filters=filters or None)
 
     def store_data(self, name: str, data: Dict):
         self.loaded_data[name] = data
@@ -382,7 +671,7 @@ class DataModel:
         }
         try:
             print(f"[WFS] Fetching brannstasjoner from {wfs_url} (BBOX={bbox})")
-            r = requests.get(wfs_url, params=params, timeout=15)
+            r = self.http.get(wfs_url, params=params, timeout=15)
             r.raise_for_status()
             features = self._parse_brannstasjoner_gml(r.text)
             print(f"[WFS] OK Parsed {len(features)} brannstasjoner from GML")
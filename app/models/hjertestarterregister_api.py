@@ -3,14 +3,27 @@ HjertestarterregisterAPI.py - REST client for Hjertestarterregister API
 Fetches AED (Automated External Defibrillator) locations from Hjertestarterregister
 """
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
 import os
-from typing import Dict, List, Optional, Tuple
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
 from datetime import datetime
 from dotenv import load_dotenv
 import math
 
-# Load environment variables from .env file
-load_dotenv()
+
+# API field → GeoJSON property, copied as-is by convert_to_geojson
+_API_PROPERTY_KEYS = (
+    'ASSET_ID', 'ASSET_GUID', 'SITE_NAME', 'SITE_ADDRESS', 'SITE_POST_CODE',
+    'SITE_POST_AREA', 'SITE_FLOOR_NUMBER', 'SITE_DESCRIPTION', 'SITE_ACCESS_INFO',
+    'OPENING_HOURS_TEXT', 'ASSET_TYPE_NAME', 'SERIAL_NUMBER', 'ASSET_STATUS',
+    'CREATED_DATE', 'MODIFIED_DATE',
+)
+_GEOJSON_PROPERTY_KEYS = tuple(k.lower() for k in _API_PROPERTY_KEYS)
 
 
 class HjertestarterregisterAPI:
@@ -25,20 +38,42 @@ class HjertestarterregisterAPI:
     # Kristiansand city center coordinates
     KRISTIANSAND_CENTER = {"latitude": 58.1414, "longitude": 8.0842}
     DEFAULT_SEARCH_RADIUS = 15000  # 15 km in meters
+    # Refresh the token this many seconds before the server says it expires
+    TOKEN_REFRESH_MARGIN = 60
+    # search_available_aeds answers from an earlier search this young whose circle
+    # contains the new one (open status changes, so keep it short)
+    SEARCH_REUSE_TTL = 300
+    SEARCH_REUSE_SLOTS = 8
     
-    def __init__(self, client_id: str = None, client_secret: str = None):
+    def __init__(self, client_id: str = None, client_secret: str = None,
+                 session: Optional[requests.Session] = None):
         """
         Initialize API client
         :param client_id: OAuth Client ID (optional, loads from env if not provided)
         :param client_secret: OAuth Client Secret (optional, loads from env if not provided)
+        :param session: Shared requests.Session to reuse pooled connections (optional)
         """
-        # Load from environment if not provided as parameters
+        # Load from environment if not provided as parameters (.env only read when needed)
+        if not (client_id and client_secret) and 'HJERTESTARTERREGISTER_CLIENT_ID' not in os.environ:
+            load_dotenv()
         self.client_id = client_id or os.getenv('HJERTESTARTERREGISTER_CLIENT_ID')
         self.client_secret = client_secret or os.getenv('HJERTESTARTERREGISTER_CLIENT_SECRET')
         self.access_token = None
         self.token_type = "bearer"
         self.token_expires_at = None
-        self.session = requests.Session()
+        # Per-client, not on the session: the session may be shared with other hosts
+        self._headers: Dict = {}
+        self._headers_key: Optional[Tuple] = None
+        # (fetched_at, latitude, longitude, distance_m, assets), newest last
+        self._recent_searches: List[Tuple[float, float, float, float, List[Dict]]] = []
+        if session is None:
+            # Standalone use (sync/analysis scripts): own pooled session with retry
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(
+                pool_connections=4, pool_maxsize=20,
+                max_retries=Retry(total=3, backoff_factor=0.3,
+                                  status_forcelist=(429, 500, 502, 503, 504))))
+        self.session = session
     
     def set_credentials(self, client_id: str, client_secret: str):
         """Set OAuth credentials"""
@@ -60,7 +95,7 @@ class HjertestarterregisterAPI:
             auth = (self.client_id, self.client_secret)
             data = {"grant_type": "client_credentials"}
             
-            response = requests.post(
+            response = self.session.post(
                 self.OAUTH_ENDPOINT,
                 auth=auth,
                 data=data,
@@ -68,16 +103,18 @@ class HjertestarterregisterAPI:
             )
             response.raise_for_status()
             
-            result = response.json()
+            result = orjson.loads(response.content)
             self.access_token = result.get('access_token')
             self.token_type = result.get('token_type', 'bearer')
             expires_in = result.get('expires_in', 3600)
-            self.token_expires_at = datetime.now().timestamp() + expires_in
+            self.token_expires_at = (datetime.now().timestamp() + expires_in
+                                     - self.TOKEN_REFRESH_MARGIN)
+            self._save_token()
             
             print(f"✓ Authentication successful. Token expires in {expires_in} seconds")
             return True
         
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
             print(f"✗ Authentication failed: {e}")
             return False
     
@@ -88,17 +125,60 @@ class HjertestarterregisterAPI:
         return datetime.now().timestamp() >= self.token_expires_at
     
     def _ensure_authenticated(self) -> bool:
-        """Ensure we have a valid token, re-authenticate if needed"""
+        """Ensure we have a valid token: in memory, then on disk, else re-authenticate"""
         if self._token_expired():
+            if self._load_token() and not self._token_expired():
+                return True
             return self.authenticate()
         return True
+
+    def _token_cache_path(self) -> Optional[Path]:
+        """Per-client token file in IS218_CACHE_DIR (shared by workers and script runs)"""
+        if not self.client_id:
+            return None
+        cache_dir = Path(os.getenv('IS218_CACHE_DIR', Path.home() / '.cache' / 'is218'))
+        digest = hashlib.sha1(self.client_id.encode()).hexdigest()[:12]
+        return cache_dir / f"aed_token_{digest}.json"
+
+    def _load_token(self) -> bool:
+        path = self._token_cache_path()
+        try:
+            cached = orjson.loads(path.read_bytes()) if path else None
+        except (OSError, orjson.JSONDecodeError):
+            return False
+        if not cached:
+            return False
+        self.access_token = cached.get('access_token')
+        self.token_type = cached.get('token_type', 'bearer')
+        self.token_expires_at = cached.get('expires_at')
+        return True
+
+    def _save_token(self):
+        path = self._token_cache_path()
+        if not path or not self.access_token:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix('.tmp')
+            # Owner-only: the file holds a live bearer token
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(orjson.dumps({'access_token': self.access_token,
+                                      'token_type': self.token_type,
+                                      'expires_at': self.token_expires_at}))
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠ Could not cache token: {e}")
     
     def _get_headers(self) -> Dict:
-        """Get request headers with authentication"""
-        headers = {"Content-Type": "application/json"}
-        if self.access_token:
-            headers["Authorization"] = f"{self.token_type} {self.access_token}"
-        return headers
+        """Get request headers with authentication (rebuilt only when the token changes)"""
+        key = (self.token_type, self.access_token)
+        if self._headers_key != key:
+            headers = {"Content-Type": "application/json"}
+            if self.access_token:
+                headers["Authorization"] = f"{self.token_type} {self.access_token}"
+            self._headers, self._headers_key = headers, key
+        return self._headers
     
     @staticmethod
     def _haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -179,12 +259,52 @@ class HjertestarterregisterAPI:
                     return None
             
             response.raise_for_status()
-            return response.json()
+            return orjson.loads(response.content)
         
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
             print(f"✗ Error searching assets: {e}")
             return None
     
+    def search_many(self, regions: List[Tuple[float, float, int]],
+                    max_rows: int = 5000, max_workers: int = 8) -> Optional[Dict]:
+        """
+        Run search_assets for several (latitude, longitude, distance_m) regions
+        concurrently and merge the results, e.g. for a tiled Norway-wide scan
+
+        :param regions: List of (latitude, longitude, distance in meters)
+        :param max_rows: Maximum rows per region
+        :param max_workers: Concurrent requests on the pooled session
+        :return: Merged response (see merge_responses), or None if not authenticated
+        """
+        # Authenticate once up front so the workers don't race for a token
+        if not regions or not self._ensure_authenticated():
+            return None
+
+        def _search(region):
+            lat, lng, dist = region
+            return self.search_assets(latitude=lat, longitude=lng,
+                                      distance=dist, max_rows=max_rows)
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(regions))) as pool:
+            return self.merge_responses(pool.map(_search, regions))
+
+    @staticmethod
+    def merge_responses(responses) -> Dict:
+        """
+        Merge search_assets responses, keeping the first copy of each AED
+        (overlapping search circles return the same asset more than once)
+
+        :param responses: Iterable of search_assets results (None entries are skipped)
+        :return: {'ASSETS': [...]} unique on ASSET_GUID, falling back to ASSET_ID
+        """
+        merged = {}
+        for response in responses:
+            for asset in (response or {}).get('ASSETS', []):
+                key = asset.get('ASSET_GUID') or asset.get('ASSET_ID') or id(asset)
+                if key not in merged:
+                    merged[key] = asset
+        return {'ASSETS': list(merged.values())}
+
     def search_available_aeds(self,
                              latitude: float = None,
                              longitude: float = None,
@@ -205,12 +325,19 @@ class HjertestarterregisterAPI:
         if distance is None:
             distance = self.DEFAULT_SEARCH_RADIUS
         
-        # Search for assets
-        response = self.search_assets(
-            latitude=latitude,
-            longitude=longitude,
-            distance=distance
-        )
+        # Pan/zoom inside an already fetched circle: filter that result, no API call
+        cached_assets = self._covering_search(latitude, longitude, distance)
+        if cached_assets is not None:
+            response = {'ASSETS': cached_assets}
+        else:
+            response = self.search_assets(
+                latitude=latitude,
+                longitude=longitude,
+                distance=distance
+            )
+            if response and 'ASSETS' in response:
+                self._recent_searches = self._recent_searches[-(self.SEARCH_REUSE_SLOTS - 1):] + [
+                    (datetime.now().timestamp(), latitude, longitude, distance, response['ASSETS'])]
         
         if not response or 'ASSETS' not in response:
             return []
@@ -236,6 +363,9 @@ class HjertestarterregisterAPI:
                     float(asset['SITE_LATITUDE']),
                     float(asset['SITE_LONGITUDE'])
                 )
+                # A reused (larger) search circle holds AEDs outside this one
+                if cached_assets is not None and dist_meters > distance:
+                    continue
                 
                 # Prepare AED record with distance
                 aed_record = {
@@ -262,58 +392,55 @@ class HjertestarterregisterAPI:
         
         return available_aeds
     
-    def convert_to_geojson(self, api_response: Dict) -> Dict:
+    def _covering_search(self, latitude: float, longitude: float,
+                         distance: float) -> Optional[List[Dict]]:
+        """Assets of a fresh earlier search whose circle contains this one, else None"""
+        now = datetime.now().timestamp()
+        for fetched_at, lat, lng, dist, assets in reversed(self._recent_searches):
+            if (now - fetched_at <= self.SEARCH_REUSE_TTL and
+                    self._haversine_distance(lat, lng, latitude, longitude) + distance <= dist):
+                return assets
+        return None
+    
+    def convert_to_geojson(self, api_response: Dict,
+                           fields: Optional[Iterable[str]] = None) -> Dict:
         """
         Convert API response to GeoJSON format
         
         :param api_response: Response from API search methods
+        :param fields: Property names to keep, e.g. only what a popup shows (default: all).
+                       The is_open/is_available/is_active flags are always included
         :return: GeoJSON FeatureCollection
         """
         if not api_response or 'ASSETS' not in api_response:
             return {"type": "FeatureCollection", "features": []}
         
-        features = []
+        # Resolve the key lists once per call, not per feature
+        geojson_keys, api_keys = _GEOJSON_PROPERTY_KEYS, _API_PROPERTY_KEYS
+        if fields is not None:
+            wanted = set(fields)
+            pairs = [(g, a) for g, a in zip(geojson_keys, api_keys) if g in wanted]
+            geojson_keys, api_keys = tuple(zip(*pairs)) or ((), ())
         
-        for asset in api_response['ASSETS']:
-            # Skip if no location data
-            if not asset.get('SITE_LATITUDE') or not asset.get('SITE_LONGITUDE'):
-                continue
-            
-            properties = {
-                'asset_id': asset.get('ASSET_ID'),
-                'asset_guid': asset.get('ASSET_GUID'),
-                'site_name': asset.get('SITE_NAME'),
-                'site_address': asset.get('SITE_ADDRESS'),
-                'site_post_code': asset.get('SITE_POST_CODE'),
-                'site_post_area': asset.get('SITE_POST_AREA'),
-                'site_floor_number': asset.get('SITE_FLOOR_NUMBER'),
-                'site_description': asset.get('SITE_DESCRIPTION'),
-                'site_access_info': asset.get('SITE_ACCESS_INFO'),
-                'opening_hours_text': asset.get('OPENING_HOURS_TEXT'),
-                'asset_type_name': asset.get('ASSET_TYPE_NAME'),
-                'serial_number': asset.get('SERIAL_NUMBER'),
-                'is_active': asset.get('ACTIVE') == 'Y',
-                'is_open': asset.get('IS_OPEN') == 'Y',
-                'is_available': asset.get('IS_OPEN') == 'Y',
-                'is_open_status': asset.get('IS_OPEN', 'N'),
-                'asset_status': asset.get('ASSET_STATUS'),
-                'created_date': asset.get('CREATED_DATE'),
-                'modified_date': asset.get('MODIFIED_DATE'),
-            }
-            
-            feature = {
+        features = [
+            {
                 "type": "Feature",
                 "geometry": {
                     "type": "Point",
-                    "coordinates": [
-                        asset['SITE_LONGITUDE'],
-                        asset['SITE_LATITUDE']
-                    ]
+                    "coordinates": [asset['SITE_LONGITUDE'], asset['SITE_LATITUDE']]
                 },
-                "properties": properties
+                "properties": {
+                    **dict(zip(geojson_keys, map(asset.get, api_keys))),
+                    'is_active': asset.get('ACTIVE') == 'Y',
+                    'is_open': (is_open := asset.get('IS_OPEN') == 'Y'),
+                    'is_available': is_open,
+                    'is_open_status': asset.get('IS_OPEN', 'N'),
+                }
             }
-            
-            features.append(feature)
+            # Skip if no location data
+            for asset in api_response['ASSETS']
+            if asset.get('SITE_LATITUDE') and asset.get('SITE_LONGITUDE')
+        ]
         
         return {
             "type": "FeatureCollection",
@@ -1,16 +1,32 @@
 """
 MapModel.py - Manages map state, layers, and viewport
 """
+from dataclasses import dataclass, field, fields
 from typing import Dict, List, Tuple, Optional
 
 
+@dataclass(slots=True)
+class Layer:
+    """One map layer; slotted since a model can hold many of them"""
+    name: str
+    type: str = ''
+    visible: bool = True
+    color: str = '#3388ff'
+    features: List[Dict] = field(default_factory=list)
+
+
+_LAYER_FIELDS = frozenset(f.name for f in fields(Layer))
+
+
 class MapModel:
     def __init__(self):
         self.map_center = [58.1414, 8.0842]  # Kristiansand, Agder
         self.zoom_level = 10  # Zoomed to Agder region
-        self.layers = {}
+        self.layers: Dict[str, Layer] = {}
         self.spatial_bounds = None
         self.search_point = None
+        # layer -> teljar, aukar ved kvar set_layer_features (uendra lag kan hoppast over)
+        self._layer_version: Dict[str, int] = {}
 
     def add_layer(self, name: str, config: Dict):
         """
@@ -18,29 +34,33 @@ class MapModel:
         :param name: Layer identifier
         :param config: Layer configuration
         """
-        self.layers[name] = {
-            'name': name,
-            'visible': True,
-            'color': '#3388ff',
-            'features': [],
-            **config
-        }
+        known = {k: v for k, v in config.items() if k in _LAYER_FIELDS}
+        extra = config.keys() - known.keys()
+        if extra:
+            print(f"WARN Layer '{name}': ignoring unknown config keys {sorted(extra)}")
+        self.layers[name] = Layer(**{'name': name, **known})
 
     def toggle_layer(self, name: str) -> bool:
         """Toggle layer visibility"""
         if name in self.layers:
-            self.layers[name]['visible'] = not self.layers[name]['visible']
-            return self.layers[name]['visible']
+            layer = self.layers[name]
+            layer.visible = not layer.visible
+            return layer.visible
         return False
 
     def set_layer_features(self, name: str, features: List[Dict]):
         """Set features for a layer"""
         if name in self.layers:
-            self.layers[name]['features'] = features
+            self.layers[name].features = features
+            self._layer_version[name] = self._layer_version.get(name, 0) + 1
+
+    def layer_version(self, name: str) -> int:
+        """Change counter for a layer's features (0 = never set)"""
+        return self._layer_version.get(name, 0)
 
-    def get_visible_layers(self) -> List[Dict]:
+    def get_visible_layers(self) -> List[Layer]:
         """Get all visible layers"""
-        return [layer for layer in self.layers.values() if layer['visible']]
+        return [layer for layer in self.layers.values() if layer.visible]
 
     def set_viewport(self, center: List[float], zoom: int):
         """Update map viewport"""
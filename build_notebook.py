@@ -214,6 +214,8 @@ print(f"AED-ar innanfor kommunen: {len(aeds_i_krs)}/{len(aeds_open)}")
 """))
 
 CELLS.append(code("""# Interaktivt kart med Folium — alle inngangsdata
+# Kvart lag er eitt folium.GeoJson (éin FeatureCollection) i staden for
+# éin Python-markør per punkt; Leaflet teiknar markørane klientsida.
 m = folium.Map(location=[58.1414, 8.0842], zoom_start=11, tiles="OpenStreetMap")
 
 # Kommunegrense
@@ -224,28 +226,28 @@ folium.GeoJson(
 ).add_to(m)
 
 # AED-ar
-for _, r in aeds_open.iterrows():
-    folium.CircleMarker(
-        [r.geometry.y, r.geometry.x], radius=5, color="#27ae60",
-        fill=True, fill_opacity=0.8,
-        popup=r.get("site_name", "AED"),
-    ).add_to(m)
+folium.GeoJson(
+    aeds_open[["site_name", "geometry"]].__geo_interface__,
+    name="AED",
+    marker=folium.CircleMarker(radius=5, color="#27ae60", fill=True, fill_opacity=0.8),
+    popup=folium.GeoJsonPopup(fields=["site_name"], labels=False),
+).add_to(m)
 
 # Brannstasjonar
-for _, r in brann.iterrows():
-    folium.Marker(
-        [r.geometry.y, r.geometry.x],
-        icon=folium.Icon(color="orange", icon="fire"),
-        popup=r.get("brannstasjon", "Brannstasjon"),
-    ).add_to(m)
+folium.GeoJson(
+    brann[["brannstasjon", "geometry"]].__geo_interface__,
+    name="Brannstasjonar",
+    marker=folium.Marker(icon=folium.Icon(color="orange", icon="fire")),
+    popup=folium.GeoJsonPopup(fields=["brannstasjon"], labels=False),
+).add_to(m)
 
 # Landmarks
-for _, r in landmarks_pts.iterrows():
-    folium.Marker(
-        [r.geometry.y, r.geometry.x],
-        icon=folium.Icon(color="blue", icon="info-sign"),
-        popup=f"{r.get('name', '')} ({r.get('category', '')})",
-    ).add_to(m)
+folium.GeoJson(
+    landmarks_pts[["name", "category", "geometry"]].__geo_interface__,
+    name="Beredskapsressursar",
+    marker=folium.Marker(icon=folium.Icon(color="blue", icon="info-sign")),
+    popup=folium.GeoJsonPopup(fields=["name", "category"], labels=False),
+).add_to(m)
 m
 """))
 
@@ -0,0 +1,18 @@
+"""
+gunicorn.conf.py - Produksjonsoppsett (gunicorn + gevent), sjå Procfile
+"""
+# Må patche før noko anna vert importert: med preload_app lastar masteren
+# app-pakken (requests/urllib3, httpx, ssl) før workerane forkar, og gevent-
+# workeren patchar først etter det. Upatcha ssl/socket i masteren → blokkerande
+# I/O og "MonkeyPatchWarning" i kvar worker.
+from gevent import monkey
+monkey.patch_all()
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '3000')}"
+workers = 4
+worker_class = 'gevent'
+worker_connections = 1000
+# Controller.initialize() køyrer éin gong i masteren; workerane arvar lagdata via fork
+preload_app = True
@@ -5,7 +5,7 @@ Run this file to start the web map server
 """
 import os
 import sys
-from app import app, controller
+from app import app
 
 
 if __name__ == '__main__':
@@ -13,13 +13,17 @@ if __name__ == '__main__':
     print("Interactive Web Map - Python Flask + MVC")
     print("=" * 50)
     print()
-    print("OK Starting Flask server on http://localhost:3000")
+    # Utviklingsserver: tråd per førespurnad, debugger berre med FLASK_DEBUG=1.
+    # Produksjon køyrer gunicorn + gevent, sjå Procfile. gevent-patchinga ligg i
+    # gunicorn.conf.py, så denne stien køyrer på vanlege trådar utan patch.
+    port = int(os.getenv('PORT', 3000))
+    debug = os.getenv('FLASK_DEBUG') == '1'
+    print(f"OK Starting Flask server on http://localhost:{port}" + (" (debug)" if debug else ""))
     print("OK Press Ctrl+C to stop the server")
     print()
     
     try:
-        controller.initialize()
-        app.run(debug=True, port=3000, use_reloader=False)
+        app.run(debug=debug, port=port, threaded=True, use_reloader=False)
     except KeyboardInterrupt:
         print("\n\nOK Server stopped")
         sys.exit(0)
@@ -22,6 +22,7 @@ import sys
 from pathlib import Path
 
 import geopandas as gpd
+import orjson
 
 sys.path.insert(0, str(Path(__file__).parent))
 
@@ -61,8 +62,8 @@ def load_aeds() -> list:
     cache = DATA_DIR / "aeds_cache.geojson"
     if os.getenv("AED_USE_CACHE", "").lower() in {"1", "true", "yes"} and cache.exists():
         print(f"[AED] Bruker cache: {cache}")
-        with open(cache, encoding="utf-8") as f:
-            return json.load(f).get("features", [])
+        with open(cache, "rb") as f:
+            return orjson.loads(f.read()).get("features", [])
 
     # Prøv Supabase
     try:
@@ -106,8 +107,8 @@ def load_aeds() -> list:
 
     if cache.exists():
         print(f"[AED] Bruker cache fallback: {cache}")
-        with open(cache, encoding="utf-8") as f:
-            return json.load(f).get("features", [])
+        with open(cache, "rb") as f:
+            return orjson.loads(f.read()).get("features", [])
 
     # Fallback: dummy dataset for testing
     print("[AED] WARN Bruker dummy-datasett (få AED-ar, plassert realistisk i sentrum)")
@@ -150,8 +151,8 @@ def load_brannstasjoner() -> list:
     cache = DATA_DIR / "brannstasjoner_cache.geojson"
     if cache.exists():
         print(f"[BRANN] Bruker cache: {cache}")
-        with open(cache, encoding="utf-8") as f:
-            return json.load(f).get("features", [])
+        with open(cache, "rb") as f:
+            return orjson.loads(f.read()).get("features", [])
     try:
         from app.models.data_model import DataModel
         dm = DataModel()
@@ -182,8 +183,8 @@ def load_brannstasjoner() -> list:
 def load_landmarks() -> list:
     """Lokal GeoJSON med beredskapsressursar."""
     fp = DATA_DIR / "norwegian_landmarks.geojson"
-    with open(fp, encoding="utf-8") as f:
-        return json.load(f).get("features", [])
+    with open(fp, "rb") as f:
+        return orjson.loads(f.read()).get("features", [])
 
 
 def main():
@@ -209,12 +210,12 @@ def main():
         print("[PIPE] ERR Manglar befolkning/kommunegrense — køyr generate_population_grid.py først.")
         sys.exit(1)
 
-    with open(pop_path, encoding="utf-8") as f:
-        pop_gj = json.load(f)
+    with open(pop_path, "rb") as f:
+        pop_gj = orjson.loads(f.read())
     population_gdf = gpd.GeoDataFrame.from_features(pop_gj["features"], crs="EPSG:4326")
 
-    with open(kommune_path, encoding="utf-8") as f:
-        kommune_gj = json.load(f)
+    with open(kommune_path, "rb") as f:
+        kommune_gj = orjson.loads(f.read())
     boundary_gdf = gpd.GeoDataFrame.from_features(kommune_gj["features"], crs="EPSG:4326")
 
     print(f"[INPUT] Befolknings-celler: {len(population_gdf)}")
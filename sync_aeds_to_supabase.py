@@ -5,6 +5,7 @@ Fetches ALL AEDs (no filtering), syncs to 'hjertestartere' table, handles upsert
 """
 import os
 import hashlib
+import orjson
 from datetime import datetime
 from typing import List, Dict, Optional
 from app.models.hjertestarterregister_api import HjertestarterregisterAPI
@@ -17,9 +18,9 @@ class AEDSyncManager:
     def __init__(self):
         self.api = HjertestarterregisterAPI()
         self.data_model = DataModel()
-        self.kristiansand_lat = 58.1414
-        self.kristiansand_lng = 8.0842
-        self.search_radius_m = 15000  # 15 km
+        self.kristiansand_lat = HjertestarterregisterAPI.KRISTIANSAND_CENTER['latitude']
+        self.kristiansand_lng = HjertestarterregisterAPI.KRISTIANSAND_CENTER['longitude']
+        self.search_radius_m = HjertestarterregisterAPI.DEFAULT_SEARCH_RADIUS  # 15 km
         
         # Stats
         self.stats = {
@@ -157,60 +158,47 @@ class AEDSyncManager:
             
             existing_ids = set()
             if existing_response.status_code == 200:
-                existing_ids = {row['asset_id'] for row in existing_response.json()}
+                existing_ids = {row['asset_id'] for row in orjson.loads(existing_response.content)}
             
             self.log(f"Found {len(existing_ids)} existing AEDs in Supabase", "INFO")
             
             api_ids = {aed['asset_id'] for aed in aeds}
             
-            # 1. UPSERT (batch of 50, with on_conflict=asset_id)
-            self.log("Upserting AED records (batches of 50)...", "INFO")
+            # 1. UPSERT (batch of 500, with on_conflict=asset_id)
+            self.log("Upserting AED records (batches of 500)...", "INFO")
             new_ids = api_ids - existing_ids
-            BATCH = 50
-            for i in range(0, len(aeds), BATCH):
-                batch = aeds[i:i+BATCH]
-                try:
-                    upsert_headers = {
-                        **headers,
-                        'Prefer': 'resolution=merge-duplicates,return=minimal',
-                    }
-                    response = httpx.post(
-                        f"{rest_url}?on_conflict=asset_id",
-                        json=batch,
-                        headers=upsert_headers,
-                        timeout=30.0
-                    )
-                    if response.status_code in [200, 201]:
-                        for aed in batch:
-                            if aed['asset_id'] in new_ids:
-                                self.stats['inserted'] += 1
-                            else:
-                                self.stats['updated'] += 1
-                    else:
-                        self.log(f"Warning: batch {i//BATCH} got {response.status_code}: {response.text[:200]}", "WARNING")
-                except Exception as e:
-                    msg = f"Error upserting batch {i//BATCH}: {e}"
+            
+            def count_batch(index, batch, ok):
+                if ok:
+                    for aed in batch:
+                        if aed['asset_id'] in new_ids:
+                            self.stats['inserted'] += 1
+                        else:
+                            self.stats['updated'] += 1
+                else:
+                    msg = f"Error upserting batch {index}"
                     self.log(msg, "ERROR")
                     self.stats['errors'].append(msg)
             
+            # Shared helper: same batching, and clears DataModel's cache for the table
+            self.data_model.bulk_insert_supabase('hjertestartere', aeds, on_conflict='asset_id',
+                                                 chunk=500, on_batch=count_batch)
+            
             self.log(f"✓ Inserted: {self.stats['inserted']}", "SUCCESS")
             self.log(f"✓ Updated: {self.stats['updated']}", "SUCCESS")
             
             # 2. DELETE old records not in API
             self.log("Removing deleted AEDs...", "INFO")
-            deleted_ids = existing_ids - api_ids
+            deleted_ids = sorted(existing_ids - api_ids)
             
-            for aed_id in deleted_ids:
-                try:
-                    response = httpx.delete(
-                        f"{rest_url}?asset_id=eq.{aed_id}",
-                        headers=headers,
-                        timeout=10.0
-                    )
-                    if response.status_code in [200, 204]:
-                        self.stats['deleted'] += 1
-                except Exception as e:
-                    msg = f"Error deleting AED {aed_id}: {e}"
+            # asset_id=in.(...) in chunks — one request per 200 IDs, not one per AED
+            DELETE_BATCH = 200
+            for i in range(0, len(deleted_ids), DELETE_BATCH):
+                chunk = deleted_ids[i:i+DELETE_BATCH]
+                if self.data_model.sb.delete_in('hjertestartere', 'asset_id', chunk):
+                    self.stats['deleted'] += len(chunk)
+                else:
+                    msg = f"Error deleting AED batch {i//DELETE_BATCH} ({len(chunk)} IDs)"
                     self.log(msg, "ERROR")
                     self.stats['errors'].append(msg)
             
@@ -239,7 +227,7 @@ class AEDSyncManager:
             )
             
             if sample_response.status_code == 200:
-                samples = sample_response.json()
+                samples = orjson.loads(sample_response.content)
                 if samples:
                     self.log(f"Sample records from Supabase:", "INFO")
                     for record in samples[:2]:
@@ -253,7 +241,7 @@ class AEDSyncManager:
                 timeout=15.0
             )
             if verify_all.status_code == 200:
-                db_rows = verify_all.json()
+                db_rows = orjson.loads(verify_all.content)
                 db_ids = sorted([str(r['asset_id']) for r in db_rows])
                 db_checksum = hashlib.md5(','.join(db_ids).encode()).hexdigest()[:12]
                 supabase_suffix = os.getenv('SUPABASE_URL', '???').split('//')[1][:12] if os.getenv('SUPABASE_URL') else '???'